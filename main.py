@@ -12,9 +12,17 @@ Usage:
     - Run the module to start a simulation of Noughts and Crosses
       games.
 """
+import json
+import os
 import random
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
 from enum import Enum
 
+# Default location of the pretrained matchboxes written by train.py.
+POLICY_PATH = 'menace_policy.json'
+
 
 class Cell(Enum):
     """
@@ -30,159 +38,243 @@ class Cell(Enum):
     X     = 'X'
 
 
+# Each cell (row, col) maps to bit row * 3 + col of a 9-bit mask. A
+# board is stored as one such mask for X and one for O.
+# Written in octal, each digit is one row of the board, with the
+# rightmost digit being the top row.
+WIN_LINES = (0o007, 0o070, 0o700,  # rows
+             0o111, 0o222, 0o444,  # columns
+             0o421, 0o124)         # diagonals
+FULL_BOARD = 0o777
+# For every 9-bit mask, whether it contains a complete line. This turns
+# the win test for a player into a single lookup.
+HAS_LINE = bytes(
+    any((mask & line) == line for line in WIN_LINES)
+    for mask in range(FULL_BOARD + 1))
+# Move (row, col) for every cell index.
+MOVES = [(r, c) for r in range(3) for c in range(3)]
+
+
+def _grid_to_masks(grid):
+    """
+    Validate a 3x3 grid of Cell values and convert it into a pair of
+    (x_mask, o_mask) bitboards.
+    """
+    if len(grid) != 3 or any(len(row) != 3 for row in grid):
+        raise ValueError("Grid must be 3x3")
+    x = o = 0
+    bit = 1
+    for row in grid:
+        for cell in row:
+            if not isinstance(cell, Cell):
+                raise ValueError("All elements must be instances of Cell")
+            if cell is Cell.X:
+                x |= bit
+            elif cell is Cell.O:
+                o |= bit
+            bit <<= 1
+    return x, o
+
+
+def _board_index(index):
+    """
+    Normalise a row or column index into range(3), accepting negative
+    indices like a list would. Raises IndexError if it is off the board.
+    """
+    if not -3 <= index < 3:
+        raise IndexError("Board index out of range")
+    return index % 3
+
+
+def _cell_at(x, o, row, col):
+    """Return the Cell stored at (row, col) in the given bitboards."""
+    bit = 1 << (row * 3 + col)
+    if x & bit:
+        return Cell.X
+    if o & bit:
+        return Cell.O
+    return Cell.EMPTY
+
+
+def _masks_to_str(x, o):
+    """Return a printable 3x3 representation of the given bitboards."""
+    board_lines = []
+    for row in range(3):
+        board_lines.append(
+            " | ".join(_cell_at(x, o, row, col).value for col in range(3)))
+        if row < 2:
+            board_lines.append("---------")
+    return "\n".join(board_lines)
+
+
 class Board:
     """
     Represents a 3x3 Noughts and Crosses board for MENACE. Each cell
     is restricted to be an instance of Cell.
+
+    Internally the board is stored as two 9-bit masks, x and o, where
+    bit row * 3 + col is set when that player occupies the cell. Rows
+    read through board[row] are therefore tuples; change cells with
+    set_cell(row, col, cell) or replace a whole row with
+    board[row] = [...].
     """
+    __slots__ = ('x', 'o')
+
     def __init__(self, grid=None):
         if grid is None:
-            # Create a 3x3 grid initialized with Cell.EMPTY
-            self.grid = [
-                [Cell.EMPTY for _ in range(3)] for _ in range(3)
-            ]
+            self.x = 0
+            self.o = 0
         else:
-            if len(grid) != 3 or any(len(row) != 3 for row in grid):
-                raise ValueError("Grid must be 3x3")
-            for row in grid:
-                for cell in row:
-                    if not isinstance(cell, Cell):
-                        raise ValueError(
-                            "All elements must be instances of Cell")
-            self.grid = grid
+            self.x, self.o = _grid_to_masks(grid)
+
+    @property
+    def grid(self):
+        """Return the board as a tuple of tuples of Cell values."""
+        return tuple(self[row] for row in range(3))
 
     def __getitem__(self, index):
-        return self.grid[index]
+        index = _board_index(index)
+        return tuple(_cell_at(self.x, self.o, index, col) for col in range(3))
 
     def __setitem__(self, index, value):
+        index = _board_index(index)
         if not isinstance(value, list) or len(value) != 3:
             raise ValueError("Row must be a list of 3 Cell elements")
         for cell in value:
             if not isinstance(cell, Cell):
                 raise ValueError("All elements must be instances of Cell")
-        self.grid[index] = value
+        for col, cell in enumerate(value):
+            self.set_cell(index, col, cell)
 
     def get_cell(self, row, col):
         """Retrieve the cell at the specified row and column."""
-        return self.grid[row][col]
+        return _cell_at(self.x, self.o, _board_index(row), _board_index(col))
 
     def set_cell(self, row, col, cell):
         """Set the cell at the specified row and column."""
         if not isinstance(cell, Cell):
             raise ValueError("Value must be an instance of Cell")
-        self.grid[row][col] = cell
+        bit = 1 << (_board_index(row) * 3 + _board_index(col))
+        self.x &= ~bit
+        self.o &= ~bit
+        if cell is Cell.X:
+            self.x |= bit
+        elif cell is Cell.O:
+            self.o |= bit
+
+    def set_cell_unchecked(self, row, col, cell):
+        """
+        Place Cell.X or Cell.O in an empty cell without validating the
+        arguments. Intended for the game loop, where the values are
+        known to be valid.
+        """
+        bit = 1 << (row * 3 + col)
+        assert not (self.x | self.o) & bit, "Cell is already occupied"
+        if cell is Cell.X:
+            self.x |= bit
+        else:
+            self.o |= bit
 
     def __str__(self):
         """
         Return a string representation of the board.
         """
-        board_lines = []
-        for i, row in enumerate(self.grid):
-            board_lines.append(" | ".join(cell.value for cell in row))
-            if i < len(self.grid) - 1:
-                board_lines.append("---------")
-        return "\n".join(board_lines)
+        return _masks_to_str(self.x, self.o)
 
 
 class BoardState:
     """
     Represents an immutable snapshot of a 3x3 Noughts and Crosses board.
-    The internal representation is a tuple of tuples, ensuring immutability.
+    The internal representation is a pair of 9-bit masks, so hashing
+    and equality reduce to integer operations.
     """
+    __slots__ = ('x', 'o')
+
     def __init__(self, grid=None):
         if grid is None:
-            # Create a 3x3 grid initialized with Cell.EMPTY
-            self.grid = tuple(tuple(Cell.EMPTY for _ in range(3)) for _ in range(3))
+            self.x = 0
+            self.o = 0
         else:
-            if len(grid) != 3 or any(len(row) != 3 for row in grid):
-                raise ValueError("Grid must be 3x3")
-            new_grid = []
-            for row in grid:
-                new_row = []
-                for cell in row:
-                    if not isinstance(cell, Cell):
-                        raise ValueError("All elements must be instances of Cell")
-                    new_row.append(cell)
-                new_grid.append(tuple(new_row))
-            self.grid = tuple(new_grid)
+            self.x, self.o = _grid_to_masks(grid)
+
+    @classmethod
+    def _from_masks(cls, x, o):
+        """
+        Build a BoardState directly from a pair of bitboards, skipping
+        grid validation. Intended for internal use where the masks are
+        already known to be consistent.
+        """
+        board_state = cls.__new__(cls)
+        board_state.x = x
+        board_state.o = o
+        return board_state
+
+    @property
+    def grid(self):
+        """Return the board state as a tuple of tuples of Cell values."""
+        return tuple(self[row] for row in range(3))
 
     def get_cell(self, row, col):
         """Retrieve the cell at the specified row and column."""
-        return self.grid[row][col]
+        return _cell_at(self.x, self.o, _board_index(row), _board_index(col))
 
     def __getitem__(self, index):
         """
         Allow indexing to retrieve entire rows from the board
         state.
         """
-        return self.grid[index]
+        index = _board_index(index)
+        return tuple(_cell_at(self.x, self.o, index, col) for col in range(3))
 
     def __str__(self):
         """
         Return a string representation of the board state.
         """
-        board_lines = []
-        for i, row in enumerate(self.grid):
-            board_lines.append(" | ".join(cell.value for cell in row))
-            if i < len(self.grid) - 1:
-                board_lines.append("---------")
-        return "\n".join(board_lines)
+        return _masks_to_str(self.x, self.o)
 
     def __eq__(self, other):
         if isinstance(other, BoardState):
-            return self.grid == other.grid
+            return self.x == other.x and self.o == other.o
         return False
 
     def __hash__(self):
-        return hash(self.grid)
-
-
-class Bead:
-    """
-    Represents a single bead corresponding to a move in MENACE.
+        return self.x | (self.o << 9)
 
-    Attributes:
-        move (tuple): A tuple (row, col) indicating the move this bead
-                      represents.
-    """
-    def __init__(self, move):
-        if not (isinstance(move, tuple) and len(move) == 2):
-            raise ValueError("Move must be a tuple of (row, col)")
-        self.move = move
 
-    def __str__(self):
-        return f"Bead(move={self.move})"
-
-    def __repr__(self):
-        return str(self)
+# Shared snapshot of the empty board, where every game starts.
+EMPTY_STATE = BoardState._from_masks(0, 0)
 
 
 class Matchbox:
     """
-    Represents a matchbox in MENACE, containing a BoardState and a
-    collection of beads corresponding to legal moves from that state.
-
-    The matchbox is associated with a specific board state and holds
-    beads for every legal move (i.e., moves into empty cells). The
-    weight of a move is determined by the number of beads representing
-    that move.
+    Represents a matchbox in MENACE, containing a BoardState and the
+    number of beads held for each legal move from that state.
+
+    Beads are not modelled individually: a matchbox only records how
+    many beads it holds for each move, in a 9-slot array where index
+    row * 3 + col holds the count for move (row, col). Illegal moves
+    (occupied cells) always hold zero beads, so the weight of a move is
+    simply its count. The slots may be supplied as a view into a larger
+    shared array, as MENACEEngine does for its matchboxes.
     """
-    def __init__(self, board_state, initial_bead_count=3):
+    __slots__ = ('board_state', 'counts')
+
+    def __init__(self, board_state, initial_bead_count=3, counts=None):
         if not isinstance(board_state, BoardState):
             raise ValueError("board_state must be an instance of BoardState")
         self.board_state = board_state
-        self.beads = []
-        
-        # Determine legal moves: iterate over all cells and check for
-        # emptiness.
-        for row in range(3):
-            for col in range(3):
-                if board_state.get_cell(row, col) == Cell.EMPTY:
-                    # Add initial_bead_count beads for each legal
-                    # move.
-                    for _ in range(initial_bead_count):
-                        self.beads.append(Bead((row, col)))
-                        
+        if counts is None:
+            counts = array('i', [0] * 9)
+        elif len(counts) != 9:
+            raise ValueError("counts must have exactly 9 slots")
+        self.counts = counts
+
+        # Determine legal moves: every cell not set in either mask.
+        occupied = board_state.x | board_state.o
+        for index in range(9):
+            if not (occupied >> index) & 1:
+                counts[index] = initial_bead_count
+
     def add_beads(self, move, count=1):
         """
         Add a specified number of beads corresponding to the given
@@ -193,15 +285,14 @@ class Matchbox:
             count (int): The number of beads to add.
         """
         # Check if the move is legal in the board state.
-        if self.board_state.get_cell(*move) != Cell.EMPTY:
+        bit = 1 << (move[0] * 3 + move[1])
+        if (self.board_state.x | self.board_state.o) & bit:
             raise ValueError("Move is not legal in this board state")
-        for _ in range(count):
-            self.beads.append(Bead(move))
+        self.counts[move[0] * 3 + move[1]] += count
     
     def remove_beads(self, move, count=1):
         """
-        Remove up to a specified number of beads for the given move by
-        going over the beads and skipping the ones to be removed.
+        Remove up to a specified number of beads for the given move.
         
         If fewer than count beads exist for that move, remove all of
         them.
@@ -210,14 +301,8 @@ class Matchbox:
             move (tuple): A tuple (row, col) representing the move.
             count (int): The maximum number of beads to remove.
         """
-        removed = 0
-        new_beads = []
-        for bead in self.beads:
-            if removed < count and bead.move == move:
-                removed += 1
-            else:
-                new_beads.append(bead)
-        self.beads = new_beads
+        index = move[0] * 3 + move[1]
+        self.counts[index] = max(0, self.counts[index] - count)
     
     def get_bead_count(self, move):
         """
@@ -229,7 +314,7 @@ class Matchbox:
         Returns:
             int: The number of beads for that move.
         """
-        return sum(1 for bead in self.beads if bead.move == move)
+        return self.counts[move[0] * 3 + move[1]]
     
     def __str__(self):
         """
@@ -237,15 +322,42 @@ class Matchbox:
         board state
         and the counts of beads per move.
         """
-        # Group the beads by move and count them.
-        move_counts = {}
-        for bead in self.beads:
-            move_counts[bead.move] = move_counts.get(bead.move, 0) + 1
+        counts = self.counts
         moves_str = ', '.join(
-            f"{move}: {count}" for move, count in move_counts.items())
+            f"{MOVES[index]}: {counts[index]}"
+            for index in range(9) if counts[index])
         return f"Matchbox for board state:\n{self.board_state}\nBeads: {moves_str}"
 
 
+# Outcome codes returned by _check_winner_masks. The first three match
+# the outcome values expected by MENACEEngine.update_learning.
+MENACE_WINS = 1
+OPPONENT_WINS = -1
+DRAW = 0
+IN_PROGRESS = -2
+
+RESULT_NAMES = {
+    MENACE_WINS: 'MENACE',
+    OPPONENT_WINS: 'opponent',
+    DRAW: 'draw',
+    IN_PROGRESS: None,
+}
+
+
+def _check_winner_masks(o, x):
+    """
+    Return the outcome code for a board given as (o, x) bitboards.
+    """
+    if HAS_LINE[o]:
+        return MENACE_WINS
+    if HAS_LINE[x]:
+        return OPPONENT_WINS
+    # Check for draw (no empty cells left)
+    if (o | x) == FULL_BOARD:
+        return DRAW
+    return IN_PROGRESS
+
+
 def check_winner(board):
     """
     Check the board for a winner.
@@ -255,25 +367,7 @@ def check_winner(board):
       - 'draw' if the board is full with no winner,
       - None if the game is still in progress.
     """
-    lines = []
-    grid = board.grid
-    # rows
-    lines.extend(grid)
-    # columns
-    lines.extend([[grid[r][c] for r in range(3)] for c in range(3)])
-    # diagonals
-    lines.append([grid[i][i] for i in range(3)])
-    lines.append([grid[i][2 - i] for i in range(3)])
-    
-    for line in lines:
-        if all(cell == Cell.O for cell in line):
-            return 'MENACE'
-        if all(cell == Cell.X for cell in line):
-            return 'opponent'
-    # Check for draw (no empty cells left)
-    if all(cell != Cell.EMPTY for row in grid for cell in row):
-        return 'draw'
-    return None
+    return RESULT_NAMES[_check_winner_masks(board.o, board.x)]
 
 
 def count_cell(board, cell):
@@ -284,92 +378,131 @@ def count_cell(board, cell):
     return sum(row.count(cell) for row in board)
 
 
+def _symmetry_perm(transform):
+    """
+    Return a tuple mapping each cell index to its destination index
+    under the given (row, col) -> (row, col) transformation.
+    """
+    return tuple(r * 3 + c for r, c in (transform(*move) for move in MOVES))
+
+
+# The 8 symmetries of the board: 4 rotations and 4 reflections. Each
+# entry maps a source cell index to its destination cell index.
+SYM_PERMS = tuple(_symmetry_perm(transform) for transform in (
+    lambda r, c: (r, c),            # identity
+    lambda r, c: (c, 2 - r),        # rotate 90 degrees clockwise
+    lambda r, c: (2 - r, 2 - c),    # rotate 180 degrees
+    lambda r, c: (2 - c, r),        # rotate 270 degrees clockwise
+    lambda r, c: (r, 2 - c),        # reflect horizontally
+    lambda r, c: (2 - r, c),        # reflect vertically
+    lambda r, c: (c, r),            # reflect on the main diagonal
+    lambda r, c: (2 - c, 2 - r),    # reflect on the anti-diagonal
+))
+
+# For each symmetry, map a destination cell index back to its source,
+# so a move chosen on the canonical board can be played on the real one.
+SYM_INVERSE = tuple(
+    tuple(perm.index(dst) for dst in range(9)) for perm in SYM_PERMS)
+
+
+def _permute_mask(mask, perm):
+    """Move every set bit i of mask to bit perm[i]."""
+    return sum(((mask >> src) & 1) << dst for src, dst in enumerate(perm))
+
+
+# Transformed value of every 9-bit mask under each symmetry, so that
+# canonicalisation costs a table lookup per symmetry instead of a loop
+# over nine bits.
+SYM_TABLES = tuple(
+    tuple(_permute_mask(mask, perm) for mask in range(FULL_BOARD + 1))
+    for perm in SYM_PERMS)
+
+
+def canonicalize(x, o):
+    """
+    Reduce a board given as (x, o) bitboards to its canonical form
+    under the 8 board symmetries.
+
+    Returns:
+        tuple: (x, o, sym) where (x, o) is the smallest transformed pair
+               and sym is the index into SYM_PERMS that produced it.
+    """
+    best_x, best_o, best_sym = x, o, 0
+    for sym in range(1, 8):
+        table = SYM_TABLES[sym]
+        tx, to = table[x], table[o]
+        if tx < best_x or (tx == best_x and to < best_o):
+            best_x, best_o, best_sym = tx, to, sym
+    return best_x, best_o, best_sym
+
+
 def canonical_board_state(grid):
     """
-    Given a board grid (tuple of tuples), generate all 8 symmetric
+    Given a board grid (tuple of tuples), consider all 8 symmetric
     transformations (rotations and reflections) and return the
-    canonical (lexicographically smallest) form.
-    """
-    def to_list(g):
-        return [list(row) for row in g]
-
-    def to_tuple(g):
-        return tuple(tuple(row) for row in g)
-
-    def rotate(g):
-        # Rotate the board 90 degrees clockwise.
-        # zip(*g[::-1]) produces tuples for each row, so convert to
-        # list.
-        return to_list(list(zip(*g[::-1])))
-
-    def reflect_horizontal(g):
-        # Reflect the board horizontally (reverse each row).
-        return [row[::-1] for row in g]
-
-    # Work with a mutable copy for transformations.
-    grids = []
-    g0 = to_list(grid)  # original as a list of lists
-
-    # 4 rotations: 0°, 90°, 180°, 270°
-    rot0 = g0
-    rot90 = rotate(rot0)
-    rot180 = rotate(rot90)
-    rot270 = rotate(rot180)
-
-    # Collect the rotated boards.
-    for g in [rot0, rot90, rot180, rot270]:
-        grids.append(to_tuple(g))
-        # Also add the horizontal reflection of each rotation.
-        grids.append(to_tuple(reflect_horizontal(g)))
-    
-    # Now pick the lexicographically smallest representation.
-    # (This works because the board is a tuple of tuples of Cell
-    # enums. They are compared based on their values, which are
-    # strings.)
-    return min(
-        grids,
-        key=lambda g: tuple(tuple(cell.value for cell in row) for row in g))
+    canonical form as a tuple of tuples.
+    """
+    x, o, _ = canonicalize(*_grid_to_masks(grid))
+    return BoardState._from_masks(x, o).grid
 
 
-def generate_all_matchboxes(initial_bead_count=3):
+def generate_menace_states():
     """
-    Generate a dictionary of all matchboxes for legal board states
+    Generate the canonical board states for every legal position
     where it's MENACE's turn. A legal board state for MENACE (playing
     as O) is one where the number of O's equals the number of X's, and
     the game is not already over.
-    
+
     Returns:
-        dict: A mapping from BoardState to its corresponding Matchbox.
+        list: The distinct canonical BoardStates, in discovery order.
     """
-    matchboxes = {}
+    states = {}
 
-    def generate_states(board, player):
+    def generate_states(x, o, moves):
         # First, if the game is over, stop recursing.
-        if check_winner(Board(board)) is not None:
+        if _check_winner_masks(o, x) != IN_PROGRESS:
             return
 
-        # Only add board states where it's MENACE's turn (O)
-        # and the game is still in progress, and there are fewer than 8 moves.
-        if (count_cell(board, Cell.O) == count_cell(board, Cell.X) and
-                (count_cell(board, Cell.O) + count_cell(board, Cell.X) < 8)):
-            canonical_grid = canonical_board_state(board)
-            board_state = BoardState(canonical_grid)
-            if board_state not in matchboxes:
-                matchboxes[board_state] = Matchbox(board_state, initial_bead_count)
-        
+        # MENACE (O) moves first, so it's MENACE's turn after an even
+        # number of moves. Only add states with fewer than 8 moves.
+        menace_to_move = moves % 2 == 0
+        if menace_to_move and moves < 8:
+            cx, co, _ = canonicalize(x, o)
+            states.setdefault(BoardState._from_masks(cx, co), None)
+
         # Try all legal moves.
-        for r in range(3):
-            for c in range(3):
-                if board[r][c] == Cell.EMPTY:
-                    board[r][c] = player
-                    next_player = Cell.X if player == Cell.O else Cell.O
-                    generate_states(board, next_player)
-                    board[r][c] = Cell.EMPTY
+        occupied = x | o
+        for index in range(9):
+            bit = 1 << index
+            if not occupied & bit:
+                if menace_to_move:
+                    generate_states(x, o | bit, moves + 1)
+                else:
+                    generate_states(x | bit, o, moves + 1)
 
     # Start with an empty board.
-    board = [[Cell.EMPTY for _ in range(3)] for _ in range(3)]
-    generate_states(board, Cell.O)
-    return matchboxes
+    generate_states(0, 0, 0)
+    return list(states)
+
+
+def generate_all_matchboxes(initial_bead_count=3):
+    """
+    Generate a dictionary of all matchboxes for legal board states
+    where it's MENACE's turn (see generate_menace_states).
+    
+    Returns:
+        dict: A mapping from BoardState to its corresponding Matchbox.
+    """
+    return {board_state: Matchbox(board_state, initial_bead_count)
+            for board_state in generate_menace_states()}
+
+
+# Number of distinct tic-tac-toe positions up to symmetry; an upper
+# bound on the number of matchboxes MENACE can ever need.
+MAX_STATES = 765
+# Up to symmetry the empty board has only three distinct moves: a
+# corner, an edge and the centre.
+OPENING_CELLS = (0, 1, 4)
 
 
 class MENACEEngine:
@@ -378,38 +511,177 @@ class MENACEEngine:
     for playing Noughts and Crosses using a matchbox-based
     reinforcement learning approach.
     """
-    def __init__(self, initial_bead_count=3):
-        # Map BoardState -> Matchbox
-        print("Generating matchboxes...")
-        self.matchboxes = generate_all_matchboxes(initial_bead_count)
-        print("Number of matchboxes: " + str(len(self.matchboxes)))
+    def __init__(self, initial_bead_count=3, policy_path=None, seed=None,
+                 policy=None):
+        """
+        Create an engine whose matchboxes come from, in order of
+        preference: policy (as returned by export_policy(), loaded
+        silently), the file at policy_path, or fresh generation.
+        """
         self.initial_bead_count = initial_bead_count
-        # History of moves made during the current game: list of
-        # (matchbox, move)
+        # Random stream for move selection. An explicit seed gives the
+        # engine its own stream (e.g. per training worker); otherwise
+        # the module-level random is used, so random.seed() still makes
+        # a run reproducible.
+        self.rng = random if seed is None else random.Random(seed)
+        if policy is not None:
+            self.import_policy(*policy)
+        else:
+            if policy_path is None:
+                print("Generating matchboxes...")
+                self._reset()
+                for board_state in generate_menace_states():
+                    self._state_id(board_state.x, board_state.o)
+            else:
+                print(f"Loading matchboxes from {policy_path}...")
+                self.load(policy_path)
+            print("Number of matchboxes: " + str(len(self.matchboxes)))
+        # History of moves made during the current game: list of slots
+        # (state id * 9 + cell index) into self.counts
         self.game_history = []
+
+    def _reset(self):
+        """Discard all matchboxes."""
+        # Bead counts for every matchbox in one flat array, with 9
+        # slots per state id.
+        self.counts = array('i', [0]) * (MAX_STATES * 9)
+        self._rows = memoryview(self.counts)
+        # Map canonical state key (x | o << 9) -> state id
+        self.state_ids = {}
+        # Map state id -> Matchbox (whose counts are a view into
+        # self.counts)
+        self.matchboxes = []
+        # Every game starts from the empty board, so it always gets
+        # state id 0. Only its OPENING_CELLS hold beads.
+        self._state_id(0, 0)
+        opening = self.matchboxes[0].counts
+        for index in range(9):
+            if index not in OPENING_CELLS:
+                opening[index] = 0
+
+    def _state_id(self, x, o):
+        """
+        Return the state id for a canonical board state, allocating a
+        new matchbox the first time the state is seen.
+        """
+        key = x | (o << 9)
+        sid = self.state_ids.get(key)
+        if sid is None:
+            sid = len(self.matchboxes)
+            if sid == MAX_STATES:
+                raise ValueError("Too many distinct board states")
+            board_state = (BoardState._from_masks(x, o) if key
+                           else EMPTY_STATE)
+            self.matchboxes.append(Matchbox(
+                board_state, self.initial_bead_count,
+                counts=self._rows[sid * 9:sid * 9 + 9]))
+            self.state_ids[key] = sid
+        return sid
+
+    def export_policy(self):
+        """
+        Return the learned policy as a list of canonical state keys
+        (x | o << 9) in state id order and a flat array holding the 9
+        bead counts of each.
+        """
+        keys = [0] * len(self.state_ids)
+        for key, sid in self.state_ids.items():
+            keys[sid] = key
+        return keys, self.counts[:len(keys) * 9]
+
+    def import_policy(self, keys, counts):
+        """
+        Replace the current matchboxes with a policy returned by
+        export_policy().
+        """
+        if len(counts) != len(keys) * 9:
+            raise ValueError("Policy must hold 9 bead counts per state")
+        self._reset()
+        for i, key in enumerate(keys):
+            if not 0 <= key < 1 << 18:
+                raise ValueError(f"Invalid state key {key}")
+            base = self._state_id(key & FULL_BOARD, key >> 9) * 9
+            self._rows[base:base + 9] = counts[i * 9:i * 9 + 9]
+
+    def merge_policies(self, policies):
+        """
+        Merge in policies exported by engines that each started from
+        this engine's current policy, e.g. parallel training workers.
+
+        Bead counts are additive: the merged count for a move is its
+        starting count plus the sum of every policy's change to it.
+        Moves that start with beads never drop below one bead.
+        """
+        counts = self.counts
+        deltas = array('i', [0]) * (MAX_STATES * 9)
+        for keys, policy_counts in policies:
+            for i, key in enumerate(keys):
+                base = self._state_id(key & FULL_BOARD, key >> 9) * 9
+                for index in range(9):
+                    deltas[base + index] += (policy_counts[i * 9 + index]
+                                             - counts[base + index])
+        for slot in range(len(self.matchboxes) * 9):
+            if counts[slot]:
+                counts[slot] = max(1, counts[slot] + deltas[slot])
+
+    def save(self, path):
+        """
+        Save the learned matchboxes to the given path so that training
+        can be skipped on later runs.
+        """
+        keys, counts = self.export_policy()
+        with open(path, 'w') as f:
+            json.dump({'keys': keys, 'counts': counts.tolist()}, f)
+
+    def load(self, path):
+        """
+        Replace the current matchboxes with ones previously written by
+        save().
+        """
+        with open(path) as f:
+            data = json.load(f)
+        self.import_policy(data['keys'], array('i', data['counts']))
         
     def get_matchbox(self, board_state):
         """
-        Retrieve the matchbox for a given board state. If it doesn't
-        exist, create it.
+        Retrieve the matchbox for a given board state, which is first
+        reduced to its canonical form. If it doesn't exist, create it.
+
+        The matchbox shares its counts with the engine, so beads added
+        or removed through it are used from the next move onwards.
         """
-        if board_state not in self.matchboxes:
-            self.matchboxes[board_state] = Matchbox(
-                board_state, self.initial_bead_count)
-        return self.matchboxes[board_state]
+        x, o, _ = canonicalize(board_state.x, board_state.o)
+        return self.matchboxes[self._state_id(x, o)]
     
     def choose_move(self, board_state):
         """
         Choose a move based on the beads in the matchbox corresponding
         to the given board state.
+
+        The matchbox is shared by every symmetric variant of the board,
+        so the move is drawn on the canonical board and mapped back to
+        the real one.
         """
-        matchbox = self.get_matchbox(board_state)
-        if not matchbox.beads:
+        if board_state.x | board_state.o:
+            x, o, sym = canonicalize(board_state.x, board_state.o)
+            sid = self._state_id(x, o)
+        else:
+            # The empty board is already canonical and always state 0.
+            sym = sid = 0
+        # Running bead totals for the state. They are not cached:
+        # counts can be written directly through any Matchbox view,
+        # which the engine cannot observe, and rebuilding them costs at
+        # most nine additions.
+        cumulative = list(accumulate(self.matchboxes[sid].counts))
+        total = cumulative[8]
+        if not total:
             raise ValueError("No legal moves available in matchbox")
-        selected_bead = random.choice(matchbox.beads)
-        # Record the matchbox and move so we can adjust later
-        self.game_history.append((matchbox, selected_bead.move))
-        return selected_bead.move
+        # Draw a move with probability proportional to its bead count:
+        # the first slot whose running total exceeds a uniform draw.
+        index = bisect_right(cumulative, self.rng.random() * total)
+        # Record the bead count slot so we can adjust it later
+        self.game_history.append(sid * 9 + index)
+        return MOVES[SYM_INVERSE[sym][index]]
     
     def update_learning(self, outcome):
         """
@@ -426,14 +698,16 @@ class MENACEEngine:
             possible).
           - For a draw, make no changes.
         """
-        for matchbox, move in self.game_history:
-            if outcome == 1:
-                matchbox.add_beads(move, count=1)
-            elif outcome == -1:
-                # Remove a bead if there's more than one (to avoid
-                # removing all moves)
-                if matchbox.get_bead_count(move) > 1:
-                    matchbox.remove_beads(move, count=1)
+        counts = self.counts
+        if outcome == 1:
+            for slot in self.game_history:
+                counts[slot] += 1
+        elif outcome == -1:
+            # Remove a bead if there's more than one (to avoid removing
+            # all moves)
+            for slot in self.game_history:
+                if counts[slot] > 1:
+                    counts[slot] -= 1
         self.game_history = []  # Clear history after learning
     
     def play_game(self, opponent_move_func, verbose=True):
@@ -448,29 +722,42 @@ class MENACEEngine:
         current_player = 'MENACE'
         self.game_history = []  # Reset history at the start of the
                                 # game
+        board_state = EMPTY_STATE
         
         while True:
-            board_state = BoardState(board.grid)
+            # Only the player who just moved can have completed a line,
+            # and since MENACE moves first the board can only fill up
+            # on MENACE's move.
             if current_player == 'MENACE':
                 move = self.choose_move(board_state)
-                board.set_cell(move[0], move[1], Cell.O)
+                board.set_cell_unchecked(move[0], move[1], Cell.O)
+                if HAS_LINE[board.o]:
+                    outcome = MENACE_WINS
+                elif (board.x | board.o) == FULL_BOARD:
+                    outcome = DRAW
+                else:
+                    outcome = IN_PROGRESS
             else:
                 move = opponent_move_func(board)
-                board.set_cell(move[0], move[1], Cell.X)
+                # The opponent's move comes from the caller, so check it
+                # before taking the unchecked path.
+                row, col = move
+                if (not (0 <= row < 3 and 0 <= col < 3)
+                        or (board.x | board.o) & (1 << (row * 3 + col))):
+                    raise ValueError(
+                        f"Opponent move {move} is not an empty cell")
+                board.set_cell_unchecked(row, col, Cell.X)
+                outcome = OPPONENT_WINS if HAS_LINE[board.x] else IN_PROGRESS
+                # MENACE moves next, from the board as it now stands.
+                board_state = BoardState._from_masks(board.x, board.o)
             
             if verbose:
                 print(board)
                 print()
             
-            result = check_winner(board)
-            if result:
-                if result == 'MENACE':
-                    self.update_learning(1)
-                elif result == 'opponent':
-                    self.update_learning(-1)
-                else:
-                    self.update_learning(0)
-                return result
+            if outcome != IN_PROGRESS:
+                self.update_learning(outcome)
+                return RESULT_NAMES[outcome]
             
             # Alternate turns
             current_player = ('opponent' if current_player == 'MENACE' 
@@ -482,8 +769,9 @@ def random_opponent_move(board):
     Simple opponent strategy: randomly select one of the available
     legal moves.
     """
-    legal_moves = [(r, c) for r in range(3) for c in range(3) 
-                   if board.get_cell(r, c) == Cell.EMPTY]
+    occupied = board.x | board.o
+    legal_moves = [MOVES[index] for index in range(9)
+                   if not (occupied >> index) & 1]
     return random.choice(legal_moves)
 
 
@@ -494,7 +782,9 @@ def main():
         print("Invalid input. Please enter an integer.")
         return
 
-    engine = MENACEEngine(initial_bead_count=3)
+    # Start from a pretrained policy (see train.py) when one exists.
+    policy_path = POLICY_PATH if os.path.exists(POLICY_PATH) else None
+    engine = MENACEEngine(initial_bead_count=3, policy_path=policy_path)
     results = {'MENACE': 0, 'opponent': 0, 'draw': 0}
 
     for i in range(runs):
@@ -0,0 +1,84 @@
+"""
+Offline training for MENACE.
+
+Plays a large number of games against the random opponent across
+worker processes and saves the merged matchboxes to disk, so that
+main.py can start from a trained policy instead of learning from
+scratch on every run.
+
+Each worker trains its own MENACEEngine, starting from the same policy,
+and shares nothing with the others until it returns its bead counts.
+Because bead counts are additive, the results are merged by summing
+every worker's changes.
+
+Usage:
+    python train.py --games 100000 --workers 4 --output menace_policy.json
+"""
+import argparse
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from main import POLICY_PATH, MENACEEngine, random_opponent_move
+
+
+def _train_batch(policy, games, initial_bead_count, seed):
+    """
+    Train an engine that starts from the given exported policy on the
+    given number of games and return its exported policy.
+
+    seed drives both MENACE's moves and the random opponent, so a
+    seeded run is reproducible.
+    """
+    random.seed(seed)
+    engine = MENACEEngine(initial_bead_count, seed=seed, policy=policy)
+    for _ in range(games):
+        engine.play_game(random_opponent_move, verbose=False)
+    return engine.export_policy()
+
+
+def train_parallel(engine, games, workers=None, seed=None):
+    """
+    Train engine on the given number of games split across worker
+    processes (one per CPU by default). Worker i is seeded with
+    seed + i, or randomly when seed is None.
+    """
+    workers = workers or os.cpu_count() or 1
+    per_worker, extra = divmod(games, workers)
+    batches = [per_worker + (i < extra) for i in range(workers)]
+    seeds = [None if seed is None else seed + i for i in range(workers)]
+    policy = engine.export_policy()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            _train_batch, [policy] * workers, batches,
+            [engine.initial_bead_count] * workers, seeds))
+    engine.merge_policies(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train MENACE offline and save its matchboxes.")
+    parser.add_argument('--games', type=int, default=100000,
+                        help="total number of games to train on")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes "
+                             "(default: one per CPU)")
+    parser.add_argument('--output', default=POLICY_PATH,
+                        help="where to save the trained matchboxes")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="base random seed for reproducible training")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue training from the policy already "
+                             "saved at --output")
+    args = parser.parse_args()
+
+    policy_path = args.output if args.resume else None
+    engine = MENACEEngine(policy_path=policy_path)
+    train_parallel(engine, args.games, args.workers, args.seed)
+    engine.save(args.output)
+    print(f"Trained on {args.games} games; saved {len(engine.matchboxes)} "
+          f"matchboxes to {args.output}")
+
+
+if __name__ == '__main__':
+    main()